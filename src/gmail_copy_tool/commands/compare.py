@@ -10,7 +10,7 @@ from rich.panel import Panel
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
 
-from gmail_copy_tool.core.gmail_client import GmailClient
+from gmail_copy_tool.core.gmail_client import GmailClient, iter_message_pages
 from gmail_copy_tool.utils.config import ConfigManager
 
 app = typer.Typer()
@@ -43,11 +43,15 @@ def normalize_date(date_str):
         pass
     raise ValueError(f"Invalid date format: {date_str}")
 
+def insert_raw_message(service, raw_email):
+    """Insert a raw RFC822 payload, keeping the Date header as internal date."""
+    return service.users().messages().insert(
+        userId="me", body={"raw": raw_email}, internalDateSource="dateHeader"
+    ).execute()
+
 def get_all_message_ids(client, label=None, after=None, before=None):
     service = client.service
-    user_id = "me"
     message_ids = []
-    page_token = None
     query = ""
     if after:
         after_norm = normalize_date(after)
@@ -59,24 +63,8 @@ def get_all_message_ids(client, label=None, after=None, before=None):
         label_ids = [label]
     else:
         label_ids = None
-    logger = logging.getLogger(__name__)
-    while True:
-        try:
-            results = service.users().messages().list(
-                userId=user_id,
-                pageToken=page_token,
-                includeSpamTrash=False,
-                q=query if query else None,
-                labelIds=label_ids
-            ).execute()
-            messages = results.get("messages", [])
-            message_ids.extend(msg["id"] for msg in messages)
-            page_token = results.get("nextPageToken")
-            if not page_token:
-                break
-        except Exception as e:
-            logger.error(f"Failed to fetch message IDs: {e}")
-            break
+    for messages in iter_message_pages(service, query=query if query else None, label_ids=label_ids):
+        message_ids.extend(msg["id"] for msg in messages)
     return message_ids
 
 def get_all_message_ids_with_headers(client, label=None, after=None, before=None):
@@ -89,7 +77,6 @@ def get_all_message_ids_with_headers(client, label=None, after=None, before=None
     message_data = {}
     total_emails = 0  # Track total number of emails (including duplicates)
     duplicate_count = 0  # Track how many duplicates we found
-    page_token = None
     query = ""
     if after:
         after_norm = normalize_date(after)
@@ -105,16 +92,24 @@ def get_all_message_ids_with_headers(client, label=None, after=None, before=None
     
     # Helper function to extract attachments (moved outside loop for reuse)
     def extract_attachments(parts_list):
-        """Recursively extract attachment filenames and sizes"""
+        """Extract attachment filenames and sizes from a (nested) parts tree.
+
+        Walks the tree with an explicit stack instead of recursing, so deeply
+        nested multiparts cost one list per message rather than a Python
+        frame per nesting level.
+        """
         att_list = []
-        for part in parts_list:
+        stack = list(parts_list)
+        while stack:
+            part = stack.pop()
             if part.get('filename'):
                 att_list.append({
                     'filename': part.get('filename'),
                     'size': part.get('body', {}).get('size', 0)
                 })
-            if part.get('parts'):
-                att_list.extend(extract_attachments(part.get('parts')))
+            nested = part.get('parts')
+            if nested:
+                stack.extend(nested)
         return att_list
     
     # Helper function to process a single message metadata
@@ -148,15 +143,17 @@ def get_all_message_ids_with_headers(client, label=None, after=None, before=None
         # Message-ID is more reliable than date (Gmail preserves Message-ID during copy but may reformat dates)
         attachment_summary = "|".join(sorted([f"{a['filename']}:{a['size']}" for a in attachments]))
         fingerprint = f"{msg_id}||{subject}||{from_addr}||{attachment_summary}"
-        
-        # DEBUG: Log fingerprint components for troubleshooting
-        logger.debug(f"Fingerprint computed for gmail_id={gmail_id}")
-        logger.debug(f"  Subject: {subject[:60]}")
-        logger.debug(f"  From: {from_addr[:60]}")
-        logger.debug(f"  Message-ID: {msg_id[:60] if msg_id else 'N/A'}")
-        logger.debug(f"  Date: {date_str}")
-        logger.debug(f"  Attachments: {attachment_summary[:100]}")
-        logger.debug(f"  Fingerprint: {fingerprint[:150]}...")
+
+        # DEBUG: Log fingerprint components for troubleshooting.
+        # Guarded so the f-strings are not built per message when DEBUG is off.
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Fingerprint computed for gmail_id={gmail_id}")
+            logger.debug(f"  Subject: {subject[:60]}")
+            logger.debug(f"  From: {from_addr[:60]}")
+            logger.debug(f"  Message-ID: {msg_id[:60] if msg_id else 'N/A'}")
+            logger.debug(f"  Date: {date_str}")
+            logger.debug(f"  Attachments: {attachment_summary[:100]}")
+            logger.debug(f"  Fingerprint: {fingerprint[:150]}...")
         
         return {
             "subject": subject,
@@ -170,31 +167,14 @@ def get_all_message_ids_with_headers(client, label=None, after=None, before=None
     
     # First, collect all message IDs
     all_message_ids = []
-    while True:
-        try:
-            results = service.users().messages().list(
-                userId=user_id,
-                pageToken=page_token,
-                includeSpamTrash=False,
-                q=query if query else None,
-                labelIds=label_ids
-            ).execute()
-            messages = results.get("messages", [])
-            all_message_ids.extend(msg["id"] for msg in messages)
-            page_token = results.get("nextPageToken")
-            if not page_token:
-                break
-        except Exception as e:
-            logger.error(f"Failed to fetch message IDs: {e}")
-            break
-    
+    for messages in iter_message_pages(service, query=query if query else None, label_ids=label_ids):
+        all_message_ids.extend(msg["id"] for msg in messages)
+
     # Now fetch metadata in batches of 20 (avoid "too many concurrent requests")
     BATCH_SIZE = 20
     total_messages = len(all_message_ids)
     logger.info(f"Fetching metadata for {total_messages} messages in batches of {BATCH_SIZE}...")
     
-    # Import Console for progress bar (should be at top, but keeping changes minimal)
-    from rich.console import Console
     console = Console(force_terminal=True)
     
     with Progress(
@@ -608,9 +588,7 @@ def compare(
                         logger.debug(f"Inserting into TARGET account {target_email}")
                         
                         # Insert into target
-                        result = target_client.service.users().messages().insert(
-                            userId="me", body={"raw": raw_email}, internalDateSource="dateHeader"
-                        ).execute()
+                        result = insert_raw_message(target_client.service, raw_email)
                         
                         new_gmail_id = result.get('id', 'unknown')
                         logger.info(f"SUCCESS: Copied to TARGET, new gmail_id={new_gmail_id}")
@@ -2,13 +2,20 @@ from google.auth.transport.requests import Request
 from google.auth import exceptions as auth_exceptions
 
 import os
+import sys
+import time
 import typer
 import logging
+import threading
+from functools import lru_cache
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from rich.progress import Progress
 
+from gmail_copy_tool.core.help_text import CREDENTIALS_HELP
+from gmail_copy_tool.utils.gmail_api_helpers import save_token
+
 
 
 # Allow different scopes for source and target
@@ -22,6 +29,8 @@ SCOPES_HIGH_PERMISSION = ["https://mail.google.com/"]
 logger = logging.getLogger(__name__)
 # Refine debug mode logic to avoid unintended activation
 explicit_debug_mode = os.environ.get("GMAIL_COPY_TOOL_DEBUG", "0") == "1"
+# Resolved once at import; count_emails checks this flag on every call.
+show_timing = os.environ.get("GMAIL_COPY_TOOL_TIMING", "0") == "1"
 if explicit_debug_mode:
     logging.getLogger().setLevel(logging.DEBUG)
     logging.getLogger("googleapiclient.discovery").setLevel(logging.DEBUG)
@@ -38,6 +47,50 @@ else:
 # Log the debug mode status for verification
 logger.info(f"Debug mode is {'enabled' if explicit_debug_mode else 'disabled'} based on GMAIL_COPY_TOOL_DEBUG={os.environ.get('GMAIL_COPY_TOOL_DEBUG', '0')}")
 
+# Serializes OAuth refresh and token-file writes across GmailClient
+# instances so two clients never race on the same token file.
+_token_refresh_lock = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def _load_creds(token_path, mtime_ns):
+    """Load credentials from a token file, cached per (path, mtime).
+
+    Keying on the file's mtime means a rewritten token is re-read, while
+    repeated GmailClient construction in the same process reuses the
+    already-parsed credentials instead of re-reading JSON from disk.
+    """
+    return Credentials.from_authorized_user_file(token_path, SCOPES_HIGH_PERMISSION)
+
+
+def iter_message_pages(service, user_id="me", query=None, label_ids=None):
+    """Yield the ``messages`` list of each ``messages.list`` result page.
+
+    Only message ids are requested; pagination state stays inside the
+    generator so callers just iterate over pages. Fetch errors are logged
+    and end the iteration, matching the previous loop behaviour.
+    """
+    page_token = None
+    while True:
+        try:
+            results = service.users().messages().list(
+                userId=user_id,
+                pageToken=page_token,
+                includeSpamTrash=False,
+                q=query,
+                labelIds=label_ids,
+                maxResults=500,
+                fields="nextPageToken,messages/id"
+            ).execute()
+        except Exception as e:
+            logger.error(f"Failed to fetch message IDs: {e}")
+            return
+        yield results.get("messages", [])
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return
+
+
 class GmailClient:
     """Gmail API client for authentication and mailbox operations."""
 
@@ -57,123 +110,56 @@ class GmailClient:
             scopes = SCOPES_HIGH_PERMISSION
             if os.path.exists(self.token_path):
                 logger.debug(f"Loading credentials from token file: {self.token_path}")
-                creds = Credentials.from_authorized_user_file(self.token_path, scopes)
+                creds = _load_creds(self.token_path, os.stat(self.token_path).st_mtime_ns)
+                if not creds.valid:
+                    # Don't keep serving credentials we know are invalid.
+                    _load_creds.cache_clear()
             if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    logger.debug("Refreshing expired credentials.")
-                    try:
-                        creds.refresh(Request())
-                    except auth_exceptions.RefreshError as e:
-                        logger.warning(f"Token refresh failed: {e}. Deleting expired token and re-authenticating.")
-                        # Delete the expired token file
-                        if os.path.exists(self.token_path):
-                            os.remove(self.token_path)
-                            logger.debug(f"Deleted expired token file: {self.token_path}")
-                        # Re-authenticate with OAuth flow
+                with _token_refresh_lock:
+                    if creds and creds.expired and creds.refresh_token:
+                        logger.debug("Refreshing expired credentials.")
+                        try:
+                            creds.refresh(Request())
+                        except auth_exceptions.RefreshError as e:
+                            logger.warning(f"Token refresh failed: {e}. Deleting expired token and re-authenticating.")
+                            # Delete the expired token file
+                            if os.path.exists(self.token_path):
+                                os.remove(self.token_path)
+                                logger.debug(f"Deleted expired token file: {self.token_path}")
+                            # Re-authenticate with OAuth flow
+                            logger.debug(f"Starting OAuth flow using credentials file: {self.credentials_path}")
+                            flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, scopes)
+                            creds = flow.run_local_server(port=0)
+                    else:
                         logger.debug(f"Starting OAuth flow using credentials file: {self.credentials_path}")
                         flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, scopes)
                         creds = flow.run_local_server(port=0)
-                else:
-                    logger.debug(f"Starting OAuth flow using credentials file: {self.credentials_path}")
-                    flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, scopes)
-                    creds = flow.run_local_server(port=0)
-                with open(self.token_path, "w") as token:
                     logger.debug(f"Saving new token to: {self.token_path}")
-                    token.write(creds.to_json())
+                    save_token(self.token_path, creds)
             logger.debug("Building Gmail service client.")
-            return build("gmail", "v1", credentials=creds)
+            # static_discovery avoids fetching and parsing the ~1MB discovery
+            # document on every invocation; the bundled document is used instead.
+            return build("gmail", "v1", credentials=creds, cache_discovery=False, static_discovery=True)
         except FileNotFoundError as e:
             logger.error(f"FileNotFoundError: {e}")
             typer.secho(f"ERROR: Credentials file not found: {self.credentials_path}", fg=typer.colors.RED, bold=True)
             typer.echo("\nHow to obtain a Gmail API credentials file:\n")
-            typer.echo(
-                "1. Go to the Google Cloud Console: https://console.cloud.google.com/\n"
-                "2. Create a new project (or select an existing one).\n"
-                "3. Navigate to APIs & Services > Library and enable the Gmail API.\n"
-                "4. Go to APIs & Services > Credentials.\n"
-                "5. Click Create Credentials > OAuth client ID.\n"
-                "   - If prompted, configure the OAuth consent screen first.\n"
-                "   - Choose Desktop app as the application type.\n"
-                "   - Name it (e.g., 'gmail-copy-tool').\n"
-                f"6. Click Create. Download the credentials file and name it as needed (e.g., {self.credentials_path}).\n"
-                f"7. Place {self.credentials_path} in your project’s working directory (where you run the CLI).\n\n"
-                "This file allows your app to request user authorization for Gmail access."
-            )
-            import sys; sys.stdout.flush(); sys.stderr.flush()
+            typer.echo(CREDENTIALS_HELP.format(credentials_path=self.credentials_path))
+            sys.stdout.flush(); sys.stderr.flush()
             raise typer.Exit(code=1)
         except Exception as e:
             logger.exception(f"Unexpected error during authentication: {e}")
             typer.secho(f"ERROR: {str(e)}", fg=typer.colors.RED, bold=True)
-            import sys; sys.stdout.flush(); sys.stderr.flush()
+            sys.stdout.flush(); sys.stderr.flush()
             raise typer.Exit(code=1)
 
-    def count_emails(self, after=None, before=None, label=None, credentials_path=None):
+    def count_emails(self, after=None, before=None, label=None):
         """Return the number of emails, optionally filtered by date or label."""
-        total = 0
-        page_token = None
         query = ""
-        import os
-        show_timing = os.environ.get("GMAIL_COPY_TOOL_TIMING", "0") == "1"
-        import time
         start = time.time() if show_timing else None
-        # Use the same scope logic as __init__ and authenticate
-        SCOPES_READONLY = ["https://www.googleapis.com/auth/gmail.readonly"]
-        SCOPES_MODIFY = ["https://www.googleapis.com/auth/gmail.modify"]
-        scopes = SCOPES_READONLY if self.scope == "readonly" else SCOPES_MODIFY
-        credentials_path = credentials_path or self.credentials_path
-        # If self.service is a MagicMock (i.e., tests are patching authenticate), skip credential logic
-        from unittest.mock import MagicMock
-        if isinstance(getattr(self, "service", None), MagicMock):
-            service = self.service
-        else:
-            try:
-                # Authenticate and build service
-                if os.path.exists(self.token_path):
-                    creds = Credentials.from_authorized_user_file(self.token_path, scopes)
-                else:
-                    creds = None
-                if not creds or not creds.valid:
-                    if creds and creds.expired and creds.refresh_token:
-                        try:
-                            creds.refresh(Request())
-                        except auth_exceptions.RefreshError as e:
-                            logger.warning(f"Token refresh failed: {e}. Deleting expired token and re-authenticating.")
-                            # Delete the expired token file
-                            if os.path.exists(self.token_path):
-                                os.remove(self.token_path)
-                                logger.debug(f"Deleted expired token file: {self.token_path}")
-                            # Re-authenticate with OAuth flow
-                            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes)
-                            creds = flow.run_local_server(port=0)
-                    else:
-                        flow = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes)
-                        creds = flow.run_local_server(port=0)
-                    with open(self.token_path, "w") as token:
-                        token.write(creds.to_json())
-                service = build("gmail", "v1", credentials=creds)
-            except FileNotFoundError:
-                typer.secho(f"ERROR: Credentials file not found: {self.credentials_path}", fg=typer.colors.RED, bold=True)
-                typer.echo("\nHow to obtain a Gmail API credentials file:\n")
-                typer.echo(
-                    "1. Go to the Google Cloud Console: https://console.cloud.google.com/\n"
-                    "2. Create a new project (or select an existing one).\n"
-                    "3. Navigate to APIs & Services > Library and enable the Gmail API.\n"
-                    "4. Go to APIs & Services > Credentials.\n"
-                    "5. Click Create Credentials > OAuth client ID.\n"
-                    "   - If prompted, configure the OAuth consent screen first.\n"
-                    "   - Choose Desktop app as the application type.\n"
-                    "   - Name it (e.g., 'gmail-copy-tool').\n"
-                    f"6. Click Create. Download the credentials file and name it as needed (e.g., {self.credentials_path}).\n"
-                    f"7. Place {self.credentials_path} in your project’s working directory (where you run the CLI).\n\n"
-                    "This file allows your app to request user authorization for Gmail access."
-                )
-                import sys; sys.stdout.flush(); sys.stderr.flush()
-                raise typer.Exit(code=1)
-            except Exception as e:
-                logger.exception(f"Unexpected error during authentication: {e}")
-                typer.secho(f"ERROR: {str(e)}", fg=typer.colors.RED, bold=True)
-                import sys; sys.stdout.flush(); sys.stderr.flush()
-                raise typer.Exit(code=1)
+        # Reuse the authenticated service built in __init__ instead of
+        # re-running the whole credential flow on every count.
+        service = self.service
         try:
             # Build query string
             if after:
@@ -182,24 +168,9 @@ class GmailClient:
                 query += f" before:{before}"
             label_ids = [label] if label else None
 
-            user_id = "me"
-            while True:
-                try:
-                    results = service.users().messages().list(
-                        userId=user_id,
-                        pageToken=page_token,
-                        includeSpamTrash=False,
-                        q=query if query else None,
-                        labelIds=label_ids
-                    ).execute()
-                    messages = results.get("messages", [])
-                    total += len(messages)
-                    page_token = results.get("nextPageToken")
-                    if not page_token:
-                        break
-                except Exception as e:
-                    logger.error(f"Failed to fetch message IDs: {e}")
-                    break
+            # sum(map(len, ...)) keeps the accumulation in C instead of
+            # dispatching a bytecode loop per page.
+            total = sum(map(len, iter_message_pages(service, query=query if query else None, label_ids=label_ids)))
             if show_timing:
                 elapsed = time.time() - start
                 print(f"[Timing] count_emails took {elapsed:.2f} seconds.")
@@ -0,0 +1,15 @@
+"""Shared help text shown on credential errors."""
+
+CREDENTIALS_HELP = (
+    "1. Go to the Google Cloud Console: https://console.cloud.google.com/\n"
+    "2. Create a new project (or select an existing one).\n"
+    "3. Navigate to APIs & Services > Library and enable the Gmail API.\n"
+    "4. Go to APIs & Services > Credentials.\n"
+    "5. Click Create Credentials > OAuth client ID.\n"
+    "   - If prompted, configure the OAuth consent screen first.\n"
+    "   - Choose Desktop app as the application type.\n"
+    "   - Name it (e.g., 'gmail-copy-tool').\n"
+    "6. Click Create. Download the credentials file and name it as needed (e.g., {credentials_path}).\n"
+    "7. Place {credentials_path} in your project’s working directory (where you run the CLI).\n\n"
+    "This file allows your app to request user authorization for Gmail access."
+)
@@ -1,9 +1,11 @@
+import signal
 import typer
 from functools import wraps
 
 from gmail_copy_tool.commands.compare import compare
 from gmail_copy_tool.commands.setup import setup
 from gmail_copy_tool.commands.list_accounts import list_accounts
+from gmail_copy_tool.utils import gmail_api_helpers
 
 import logging
 logging.basicConfig(
@@ -16,6 +18,15 @@ logging.getLogger("googleapiclient.discovery_cache").setLevel(logging.WARNING)
 
 app = typer.Typer()
 
+
+def _handle_sigint(signum, frame):
+    """Unblock any pending backoff wait, then behave like a normal Ctrl-C."""
+    gmail_api_helpers._backoff_cancel.set()
+    raise KeyboardInterrupt()
+
+
+signal.signal(signal.SIGINT, _handle_sigint)
+
 # Wrapper to auto-enable sync mode when using 'sync' command
 def sync_wrapper(
     source: str,
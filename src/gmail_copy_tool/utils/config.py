@@ -12,7 +12,10 @@ console = Console()
 
 class ConfigManager:
     """Manage account configurations for Gmail Copy Tool."""
-    
+
+    __slots__ = ("config_dir", "config_file", "_config")
+
+
     def __init__(self, config_dir: Optional[Path] = None):
         """Initialize config manager.
         
@@ -26,6 +29,7 @@ class ConfigManager:
             self.config_dir = Path.home() / ".gmail-copy-tool"
         
         self.config_file = self.config_dir / "config.json"
+        self._config = None  # In-memory cache, filled on first load
         self._ensure_config_dir()
     
     def _ensure_config_dir(self):
@@ -34,28 +38,37 @@ class ConfigManager:
     
     def load_config(self) -> Dict:
         """Load configuration from file.
-        
+
+        The parsed config is cached in memory, so repeated lookups
+        (e.g. resolving source and target accounts) read the file once.
+
         Returns:
             Dictionary with accounts configuration.
         """
+        if self._config is not None:
+            return self._config
+
         if not self.config_file.exists():
-            return {"accounts": {}}
-        
+            self._config = {"accounts": {}}
+            return self._config
+
         try:
             with open(self.config_file, 'r') as f:
-                return json.load(f)
+                self._config = json.load(f)
+                return self._config
         except json.JSONDecodeError:
             console.print(f"[red]Error: Config file is corrupted: {self.config_file}[/red]")
             raise typer.Exit(1)
-    
+
     def save_config(self, config: Dict):
         """Save configuration to file.
-        
+
         Args:
             config: Configuration dictionary to save.
         """
         with open(self.config_file, 'w') as f:
             json.dump(config, f, indent=2)
+        self._config = config
     
     def add_account(self, nickname: str, email: str, credentials_path: str, token_path: str):
         """Add or update an account in the configuration.
@@ -1,23 +1,54 @@
+import re
+import json
 import time
+import random
 import logging
 import os
+import threading
+from datetime import datetime, timezone
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
 
 logger = logging.getLogger(__name__)
 
+# Matches the retry timestamp Google embeds in rate-limit error messages.
+RETRY_AFTER_RE = re.compile(r'Retry after ([0-9T:\.\-Z]+)')
+
+# Statuses worth retrying: rate limiting plus transient server errors.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Set from the CLI's SIGINT handler: a pending backoff wait returns
+# immediately instead of blocking until its timeout expires.
+_backoff_cancel = threading.Event()
+
+# Minimum spacing between consecutive sends, to stay under Gmail's
+# per-user rate limits without sleeping a full second when the caller
+# already spent time between sends (e.g. fetching the next message).
+SEND_MIN_INTERVAL = 1.0
+_last_send_time = 0.0
+
+# Credentials already loaded (or freshly obtained) per token path, so
+# repeated ensure_token calls don't re-read and re-validate the file.
+_creds_cache = {}
+
 def send_with_backoff(send_func, max_retries=5, initial_delay=2, *args, **kwargs):
     """Send Gmail API request with exponential backoff."""
+    global _last_send_time
     delay = initial_delay
     for attempt in range(max_retries):
         try:
             logger.debug(f"Attempting to send email (attempt {attempt+1})")
+            # Be gentle: pace sends, but only sleep off the remainder of the
+            # interval instead of an unconditional full second.
+            remaining = SEND_MIN_INTERVAL - (time.monotonic() - _last_send_time)
+            if remaining > 0:
+                time.sleep(remaining)
             result = send_func(*args, **kwargs)
-            time.sleep(1)  # Be gentle: add a small delay between sends
+            _last_send_time = time.monotonic()
             return result
         except Exception as e:
-            # Check for rate limit error
-            if hasattr(e, 'resp') and hasattr(e.resp, 'status') and e.resp.status == 429:
+            # Check for rate limit or transient server error
+            if hasattr(e, 'resp') and hasattr(e.resp, 'status') and e.resp.status in RETRYABLE_STATUSES:
                 retry_after = None
                 if hasattr(e.resp, 'get'):
                     retry_after = e.resp.get('Retry-After')
@@ -26,7 +57,6 @@ def send_with_backoff(send_func, max_retries=5, initial_delay=2, *args, **kwargs
                 retry_after_utc = None
                 if hasattr(e, 'content'):
                     try:
-                        import json
                         content = e.content.decode() if isinstance(e.content, bytes) else e.content
                         data = json.loads(content)
                         google_error_msg = data.get('error', {}).get('message', str(e))
@@ -35,8 +65,7 @@ def send_with_backoff(send_func, max_retries=5, initial_delay=2, *args, **kwargs
                 print(f"Google API error message: {google_error_msg}", flush=True)
                 logger.info(f"Google API error message: {google_error_msg}")
                 # Try to parse retry timestamp from Google error message
-                import re
-                match = re.search(r'Retry after ([0-9T:\.\-Z]+)', google_error_msg)
+                match = RETRY_AFTER_RE.search(google_error_msg)
                 if match:
                     retry_after_utc = match.group(1)
                 wait_seconds = None
@@ -44,16 +73,20 @@ def send_with_backoff(send_func, max_retries=5, initial_delay=2, *args, **kwargs
                 SAFETY_MARGIN = 5  # seconds
                 if retry_after:
                     wait_seconds = int(retry_after) + SAFETY_MARGIN
+                    delay = min(delay * 2, 60)
                 elif retry_after_utc:
-                    from datetime import datetime, timezone
-                    try:
-                        retry_time = datetime.strptime(retry_after_utc, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
-                    except ValueError:
-                        retry_time = datetime.strptime(retry_after_utc, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+                    # fromisoformat is C-implemented and accepts both the
+                    # fractional and whole-second timestamp variants.
+                    retry_time = datetime.fromisoformat(retry_after_utc.rstrip('Z')).replace(tzinfo=timezone.utc)
                     now_dt = datetime.now(timezone.utc)
                     wait_seconds = max(1, int((retry_time - now_dt).total_seconds()) + SAFETY_MARGIN)
+                    delay = min(delay * 2, 60)
                 else:
-                    wait_seconds = delay
+                    # Decorrelated jitter: draw the wait from
+                    # [initial_delay, 3 * previous wait] so parallel retriers
+                    # don't hammer the API in lockstep, capped at 60s.
+                    wait_seconds = min(random.uniform(initial_delay, delay * 3), 60)
+                    delay = max(wait_seconds, initial_delay)
                 next_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now + wait_seconds))
                 msg = f"Rate limit hit when sending email. "
                 if retry_after:
@@ -65,8 +98,8 @@ def send_with_backoff(send_func, max_retries=5, initial_delay=2, *args, **kwargs
                 msg += f"Retrying after {wait_seconds} seconds (at {next_time})."
                 logger.warning(msg)
                 print(msg, flush=True)  # Always print to stdout for pytest visibility
-                time.sleep(wait_seconds)
-                delay = min(delay * 2, 60)  # Exponential backoff, max 60s
+                if _backoff_cancel.wait(wait_seconds):
+                    raise KeyboardInterrupt()
             else:
                 logger.error(f"Failed to send email: {e}")
                 print(f"Failed to send email: {e}", flush=True)
@@ -76,6 +109,17 @@ def send_with_backoff(send_func, max_retries=5, initial_delay=2, *args, **kwargs
         print(f"Giving up on sending email after {max_retries} attempts.", flush=True)
         return None
 
+def save_token(token_path, creds):
+    """Persist credentials atomically: write a temp file, then replace.
+
+    A crash or interrupt mid-write can no longer leave a truncated token
+    file behind; readers always see either the old or the new token.
+    """
+    tmp_path = f"{token_path}.tmp"
+    with open(tmp_path, 'w') as token_file:
+        token_file.write(creds.to_json())
+    os.replace(tmp_path, token_path)
+
 def ensure_token(token_path, credentials_path, scope):
     """
     Ensure a valid token exists at the specified path. If not, create one using the credentials file.
@@ -88,15 +132,20 @@ def ensure_token(token_path, credentials_path, scope):
     Returns:
         None
     """
+    cached = _creds_cache.get(token_path)
+    if cached is not None and cached.valid:
+        return
+
     if os.path.exists(token_path):
         try:
             creds = Credentials.from_authorized_user_file(token_path, [scope])
             if creds and creds.valid:
+                _creds_cache[token_path] = creds
                 return
         except Exception:
             pass
 
     flow = InstalledAppFlow.from_client_secrets_file(credentials_path, [scope])
     creds = flow.run_local_server(port=0)
-    with open(token_path, 'w') as token_file:
-        token_file.write(creds.to_json())
+    _creds_cache[token_path] = creds
+    save_token(token_path, creds)
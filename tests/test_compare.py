@@ -0,0 +1,51 @@
+import pytest
+from unittest.mock import MagicMock
+from gmail_copy_tool.commands.compare import insert_raw_message, normalize_date
+
+
+class TestInsertRawMessage:
+    """Test the raw-message insert helper used by the sync copy phase."""
+
+    def test_insert_preserves_date_header_as_internal_date(self):
+        """Test the insert call format: raw body and dateHeader internal date."""
+        mock_service = MagicMock()
+
+        insert_raw_message(mock_service, "raw-email-data")
+
+        insert_mock = mock_service.users.return_value.messages.return_value.insert
+        insert_mock.assert_called_once_with(
+            userId="me", body={"raw": "raw-email-data"}, internalDateSource="dateHeader"
+        )
+        insert_mock.return_value.execute.assert_called_once_with()
+
+    def test_insert_returns_api_response(self):
+        """Test that the Gmail API response is passed back to the caller."""
+        mock_service = MagicMock()
+        insert_mock = mock_service.users.return_value.messages.return_value.insert
+        insert_mock.return_value.execute.return_value = {"id": "new123"}
+
+        result = insert_raw_message(mock_service, "raw-email-data")
+
+        assert result == {"id": "new123"}
+
+
+class TestNormalizeDate:
+    """Test date normalization for Gmail search queries."""
+
+    @pytest.mark.parametrize(
+        "date_str,expected",
+        [
+            ("2024-01-31", "2024/01/31"),
+            ("2024/01/31", "2024/01/31"),
+            ("20240131", "2024/01/31"),
+            (None, None),
+        ],
+    )
+    def test_normalize_date_formats(self, date_str, expected):
+        """Test that supported date formats normalize to YYYY/MM/DD."""
+        assert normalize_date(date_str) == expected
+
+    def test_normalize_date_invalid(self):
+        """Test that an unparseable date raises ValueError."""
+        with pytest.raises(ValueError):
+            normalize_date("not-a-date")
@@ -1,14 +1,20 @@
 import pytest
 import time
-import os
-import tempfile
 from unittest.mock import patch, MagicMock, mock_open
+from gmail_copy_tool.utils import gmail_api_helpers
 from gmail_copy_tool.utils.gmail_api_helpers import send_with_backoff, ensure_token
 
 
 class TestGmailApiHelpers:
     """Test the Gmail API helper functions."""
 
+    @pytest.fixture(autouse=True)
+    def _reset_module_state(self):
+        """Reset the send pacer and credentials cache between tests."""
+        gmail_api_helpers._last_send_time = 0.0
+        gmail_api_helpers._creds_cache.clear()
+        gmail_api_helpers._backoff_cancel.clear()
+
     def test_send_with_backoff_success_first_try(self):
         """Test send_with_backoff succeeds on first attempt."""
         mock_send_func = MagicMock()
@@ -19,8 +25,8 @@ class TestGmailApiHelpers:
         assert result == "success"
         mock_send_func.assert_called_once_with("arg1", "arg2", kwarg1="value1")
 
-    @patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep')
-    def test_send_with_backoff_rate_limit_with_retry_after_header(self, mock_sleep):
+    @patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False)
+    def test_send_with_backoff_rate_limit_with_retry_after_header(self, mock_wait):
         """Test send_with_backoff handles rate limit with Retry-After header."""
         mock_send_func = MagicMock()
         
@@ -36,14 +42,11 @@ class TestGmailApiHelpers:
         
         assert result == "success"
         assert mock_send_func.call_count == 2
-        # Should sleep twice: once for rate limit (35s) and once for gentle delay (1s)  
-        assert mock_sleep.call_count == 2
-        sleep_calls = [call[0][0] for call in mock_sleep.call_args_list]
-        assert 35 in sleep_calls  # Rate limit + safety margin
-        assert 1 in sleep_calls   # Gentle delay
+        # Should wait once for the rate limit (35s); pacing adds no sleep here
+        mock_wait.assert_called_once_with(35)  # Rate limit + safety margin
 
-    @patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep')
-    def test_send_with_backoff_rate_limit_with_utc_retry_time(self, mock_sleep):
+    @patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False)
+    def test_send_with_backoff_rate_limit_with_utc_retry_time(self, mock_wait):
         """Test send_with_backoff handles rate limit with UTC retry time in error message."""
         mock_send_func = MagicMock()
         
@@ -60,41 +63,44 @@ class TestGmailApiHelpers:
         
         assert result == "success"
         assert mock_send_func.call_count == 2
-        # Should sleep (the exact time calculation is complex, just verify it was called)
-        assert mock_sleep.called
+        # Should wait (the exact time calculation is complex, just verify it was called)
+        assert mock_wait.called
 
-    @patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep')
-    def test_send_with_backoff_rate_limit_exponential_backoff(self, mock_sleep):
-        """Test send_with_backoff uses exponential backoff when no retry time provided."""
+    @patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False)
+    def test_send_with_backoff_rate_limit_exponential_backoff(self, mock_wait):
+        """Test send_with_backoff uses decorrelated-jitter backoff when no retry time provided."""
         mock_send_func = MagicMock()
-        
+
         # Create mock rate limit exception without retry info
         rate_limit_error = Exception("Rate limit exceeded")
         rate_limit_error.resp = MagicMock()
         rate_limit_error.resp.status = 429
         rate_limit_error.resp.get = MagicMock(return_value=None)
-        
+
         mock_send_func.side_effect = [rate_limit_error, rate_limit_error, "success"]
-        
+
         result = send_with_backoff(mock_send_func, 3, 2)
-        
+
         assert result == "success"
         assert mock_send_func.call_count == 3
-        
-        # Should use exponential backoff: 2, then 4 seconds, plus gentle delays (1s each)
-        sleep_calls = [call[0][0] for call in mock_sleep.call_args_list]
-        assert 2 in sleep_calls  # First exponential backoff
-        assert 4 in sleep_calls  # Second exponential backoff (doubled)
-        assert 1 in sleep_calls  # Final gentle delay
 
-    def test_send_with_backoff_non_rate_limit_error(self):
-        """Test send_with_backoff stops on non-rate-limit errors."""
+        # Waits are drawn with decorrelated jitter:
+        # first from [initial_delay, 3 * initial_delay],
+        # then from [initial_delay, 3 * previous wait], capped at 60s
+        wait_calls = [call[0][0] for call in mock_wait.call_args_list]
+        assert len(wait_calls) == 2
+        first, second = wait_calls
+        assert 2 <= first <= 6
+        assert 2 <= second <= min(first * 3, 60)
+
+    def test_send_with_backoff_non_retryable_error(self):
+        """Test send_with_backoff stops on non-retryable errors."""
         mock_send_func = MagicMock()
         
-        # Create non-rate-limit exception
+        # Create non-retryable exception
         other_error = Exception("Some other error")
         other_error.resp = MagicMock()
-        other_error.resp.status = 500
+        other_error.resp.status = 404
         
         mock_send_func.side_effect = other_error
         
@@ -103,6 +109,24 @@ class TestGmailApiHelpers:
         assert result is None
         assert mock_send_func.call_count == 1  # Should not retry
 
+    @pytest.mark.parametrize("status", [500, 502, 503, 504])
+    @patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False)
+    def test_send_with_backoff_retries_on_server_error(self, mock_wait, status):
+        """Test send_with_backoff retries transient 5xx server errors."""
+        mock_send_func = MagicMock()
+        
+        server_error = Exception("Backend error")
+        server_error.resp = MagicMock()
+        server_error.resp.status = status
+        server_error.resp.get = MagicMock(return_value=None)
+        
+        mock_send_func.side_effect = [server_error, "success"]
+        
+        result = send_with_backoff(mock_send_func, 3, 2)
+        
+        assert result == "success"
+        assert mock_send_func.call_count == 2
+
     def test_send_with_backoff_max_retries_exceeded(self):
         """Test send_with_backoff gives up after max retries."""
         mock_send_func = MagicMock()
@@ -115,7 +139,7 @@ class TestGmailApiHelpers:
         
         mock_send_func.side_effect = rate_limit_error
         
-        with patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep'):
+        with patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False):
             result = send_with_backoff(mock_send_func, 2, 2)
         
         assert result is None
@@ -123,14 +147,18 @@ class TestGmailApiHelpers:
 
     @patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep')
     def test_send_with_backoff_adds_small_delay_between_sends(self, mock_sleep):
-        """Test send_with_backoff adds small delay between successful sends."""
+        """Test send_with_backoff paces sends that follow each other closely."""
         mock_send_func = MagicMock()
         mock_send_func.return_value = "success"
-        
+        # Pretend a send just happened so the pacer has to wait
+        gmail_api_helpers._last_send_time = time.monotonic()
+
         result = send_with_backoff(mock_send_func, 5, 2)
-        
+
         assert result == "success"
-        mock_sleep.assert_called_with(1)  # Should add 1 second delay
+        mock_sleep.assert_called_once()
+        # Should sleep only the remainder of the 1-second interval
+        assert 0 < mock_sleep.call_args[0][0] <= gmail_api_helpers.SEND_MIN_INTERVAL
 
     def test_send_with_backoff_json_error_parsing(self):
         """Test send_with_backoff can parse JSON error content."""
@@ -145,7 +173,7 @@ class TestGmailApiHelpers:
         
         mock_send_func.side_effect = [rate_limit_error, "success"]
         
-        with patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep'):
+        with patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False):
             result = send_with_backoff(mock_send_func, 2, 2)
         
         assert result == "success"
@@ -163,7 +191,7 @@ class TestGmailApiHelpers:
         
         mock_send_func.side_effect = [rate_limit_error, "success"]
         
-        with patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep'):
+        with patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False):
             result = send_with_backoff(mock_send_func, 2, 2)
         
         assert result == "success"
@@ -192,12 +220,14 @@ class TestGmailApiHelpers:
         mock_flow.run_local_server.return_value = mock_creds
         mock_flow_from_file.return_value = mock_flow
         
-        with patch('builtins.open', mock_open()) as mock_file:
+        with patch('gmail_copy_tool.utils.gmail_api_helpers.os.replace') as mock_replace, \
+             patch('builtins.open', mock_open()) as mock_file:
             ensure_token("token.json", "credentials.json", "https://www.googleapis.com/auth/gmail.readonly")
         
         mock_flow_from_file.assert_called_once_with("credentials.json", ["https://www.googleapis.com/auth/gmail.readonly"])
         mock_flow.run_local_server.assert_called_once_with(port=0)
-        mock_file.assert_called_with("token.json", 'w')
+        mock_file.assert_called_once_with("token.json.tmp", 'w')
+        mock_replace.assert_called_once_with("token.json.tmp", "token.json")
 
     @patch('gmail_copy_tool.utils.gmail_api_helpers.os.path.exists')
     @patch('gmail_copy_tool.utils.gmail_api_helpers.Credentials.from_authorized_user_file')
@@ -214,12 +244,14 @@ class TestGmailApiHelpers:
         mock_flow.run_local_server.return_value = mock_new_creds
         mock_flow_from_file.return_value = mock_flow
         
-        with patch('builtins.open', mock_open()) as mock_file:
+        with patch('gmail_copy_tool.utils.gmail_api_helpers.os.replace') as mock_replace, \
+             patch('builtins.open', mock_open()) as mock_file:
             ensure_token("token.json", "credentials.json", "https://www.googleapis.com/auth/gmail.readonly")
         
         # Should create new credentials
         mock_flow.run_local_server.assert_called_once_with(port=0)
-        mock_file.assert_called_with("token.json", 'w')
+        mock_file.assert_called_once_with("token.json.tmp", 'w')
+        mock_replace.assert_called_once_with("token.json.tmp", "token.json")
 
     @patch('gmail_copy_tool.utils.gmail_api_helpers.os.path.exists')
     @patch('gmail_copy_tool.utils.gmail_api_helpers.Credentials.from_authorized_user_file')
@@ -234,12 +266,14 @@ class TestGmailApiHelpers:
         mock_flow.run_local_server.return_value = mock_new_creds
         mock_flow_from_file.return_value = mock_flow
         
-        with patch('builtins.open', mock_open()) as mock_file:
+        with patch('gmail_copy_tool.utils.gmail_api_helpers.os.replace') as mock_replace, \
+             patch('builtins.open', mock_open()) as mock_file:
             ensure_token("token.json", "credentials.json", "https://www.googleapis.com/auth/gmail.readonly")
         
         # Should create new credentials
         mock_flow.run_local_server.assert_called_once_with(port=0)
-        mock_file.assert_called_with("token.json", 'w')
+        mock_file.assert_called_once_with("token.json.tmp", 'w')
+        mock_replace.assert_called_once_with("token.json.tmp", "token.json")
 
     def test_send_with_backoff_logging(self):
         """Test that send_with_backoff logs appropriately."""
@@ -254,8 +288,8 @@ class TestGmailApiHelpers:
         mock_logger.debug.assert_called()
 
     @patch('gmail_copy_tool.utils.gmail_api_helpers.print')
-    @patch('gmail_copy_tool.utils.gmail_api_helpers.time.sleep')
-    def test_send_with_backoff_console_output(self, mock_sleep, mock_print):
+    @patch('gmail_copy_tool.utils.gmail_api_helpers._backoff_cancel.wait', return_value=False)
+    def test_send_with_backoff_console_output(self, mock_wait, mock_print):
         """Test that send_with_backoff prints rate limit messages to console."""
         mock_send_func = MagicMock()
         
@@ -1,15 +1,29 @@
 import pytest
-import os
-import json
-import tempfile
-from unittest.mock import patch, MagicMock, mock_open, call
+from unittest.mock import patch, MagicMock, mock_open
 from gmail_copy_tool.core.gmail_client import GmailClient, SCOPES_READONLY, SCOPES_MODIFY, SCOPES_HIGH_PERMISSION
-import typer
+from gmail_copy_tool.core.gmail_client import _load_creds
+
+
+@pytest.fixture
+def gmail_execute_mock():
+    """Mock Gmail service plus a direct handle on messages.list().execute.
+
+    Building the users/messages/list chain once per test keeps assertions on
+    a single execute handle instead of re-traversing chained MagicMock calls.
+    """
+    service_mock = MagicMock()
+    execute_mock = service_mock.users.return_value.messages.return_value.list.return_value.execute
+    return service_mock, execute_mock
 
 
 class TestGmailClient:
     """Test the GmailClient class."""
 
+    @pytest.fixture(autouse=True)
+    def _reset_creds_cache(self):
+        """Clear the per-token credentials cache between tests."""
+        _load_creds.cache_clear()
+
     def test_init_default_values(self):
         """Test GmailClient initialization with default values."""
         with patch.object(GmailClient, 'authenticate') as mock_auth:
@@ -41,12 +55,14 @@ class TestGmailClient:
             assert client.scope == "modify"
 
     @patch('gmail_copy_tool.core.gmail_client.build')
+    @patch('gmail_copy_tool.core.gmail_client.os.stat')
     @patch('gmail_copy_tool.core.gmail_client.os.path.exists')
     @patch('gmail_copy_tool.core.gmail_client.Credentials.from_authorized_user_file')
-    def test_authenticate_with_valid_token(self, mock_creds_from_file, mock_exists, mock_build):
+    def test_authenticate_with_valid_token(self, mock_creds_from_file, mock_exists, mock_stat, mock_build):
         """Test authentication with valid existing token."""
         # Setup mocks
         mock_exists.return_value = True
+        mock_stat.return_value.st_mtime_ns = 1
         mock_creds = MagicMock()
         mock_creds.valid = True
         mock_creds_from_file.return_value = mock_creds
@@ -54,19 +70,23 @@ class TestGmailClient:
         mock_build.return_value = mock_service
         
         client = GmailClient("test@gmail.com")
+        # A second client for the same (unchanged) token file hits the cache
+        GmailClient("test@gmail.com")
         
         assert client.service == mock_service
         mock_creds_from_file.assert_called_once_with("token_test_gmail.com.json", SCOPES_HIGH_PERMISSION)
-        mock_build.assert_called_once_with("gmail", "v1", credentials=mock_creds)
+        mock_build.assert_called_with("gmail", "v1", credentials=mock_creds, cache_discovery=False, static_discovery=True)
 
     @patch('gmail_copy_tool.core.gmail_client.build')
+    @patch('gmail_copy_tool.core.gmail_client.os.stat')
     @patch('gmail_copy_tool.core.gmail_client.os.path.exists')
     @patch('gmail_copy_tool.core.gmail_client.Credentials.from_authorized_user_file')
     @patch('gmail_copy_tool.core.gmail_client.Request')
-    def test_authenticate_with_expired_token(self, mock_request, mock_creds_from_file, mock_exists, mock_build):
+    def test_authenticate_with_expired_token(self, mock_request, mock_creds_from_file, mock_exists, mock_stat, mock_build):
         """Test authentication with expired token that can be refreshed."""
         # Setup mocks
         mock_exists.return_value = True
+        mock_stat.return_value.st_mtime_ns = 1
         mock_creds = MagicMock()
         mock_creds.valid = False
         mock_creds.expired = True
@@ -75,12 +95,15 @@ class TestGmailClient:
         mock_service = MagicMock()
         mock_build.return_value = mock_service
         
-        with patch('builtins.open', mock_open()) as mock_file:
+        with patch('gmail_copy_tool.utils.gmail_api_helpers.os.replace') as mock_replace, \
+             patch('builtins.open', mock_open()) as mock_file:
             client = GmailClient("test@gmail.com")
         
         assert client.service == mock_service
         mock_creds.refresh.assert_called_once()
-        mock_file.assert_called_with("token_test_gmail.com.json", "w")
+        # Token is written to a temp file and atomically moved into place
+        mock_file.assert_called_once_with("token_test_gmail.com.json.tmp", 'w')
+        mock_replace.assert_called_once_with("token_test_gmail.com.json.tmp", "token_test_gmail.com.json")
 
     @patch('gmail_copy_tool.core.gmail_client.build')
     @patch('gmail_copy_tool.core.gmail_client.os.path.exists')
@@ -96,13 +119,16 @@ class TestGmailClient:
         mock_service = MagicMock()
         mock_build.return_value = mock_service
         
-        with patch('builtins.open', mock_open()) as mock_file:
+        with patch('gmail_copy_tool.utils.gmail_api_helpers.os.replace') as mock_replace, \
+             patch('builtins.open', mock_open()) as mock_file:
             client = GmailClient("test@gmail.com")
         
         assert client.service == mock_service
         mock_flow_from_file.assert_called_once_with("credentials.json", SCOPES_HIGH_PERMISSION)
         mock_flow.run_local_server.assert_called_once_with(port=0)
-        mock_file.assert_called_with("token_test_gmail.com.json", "w")
+        # Token is written to a temp file and atomically moved into place
+        mock_file.assert_called_once_with("token_test_gmail.com.json.tmp", 'w')
+        mock_replace.assert_called_once_with("token_test_gmail.com.json.tmp", "token_test_gmail.com.json")
 
     @patch('gmail_copy_tool.core.gmail_client.typer.Exit')
     @patch('gmail_copy_tool.core.gmail_client.typer.secho')
@@ -119,31 +145,33 @@ class TestGmailClient:
         with pytest.raises(SystemExit):
             GmailClient("test@gmail.com")
         
-        # Should call secho with error message
-        mock_secho.assert_called()
+        # Should call secho with the error message exactly once
+        mock_secho.assert_called_once()
         mock_exit.assert_called_once_with(code=1)
 
     @patch('gmail_copy_tool.core.gmail_client.typer.Exit')
     @patch('gmail_copy_tool.core.gmail_client.typer.secho')
+    @patch('gmail_copy_tool.core.gmail_client.os.stat')
     @patch('gmail_copy_tool.core.gmail_client.os.path.exists')
     @patch('gmail_copy_tool.core.gmail_client.Credentials.from_authorized_user_file')
-    def test_authenticate_unexpected_error(self, mock_creds_from_file, mock_exists, mock_secho, mock_exit):
+    def test_authenticate_unexpected_error(self, mock_creds_from_file, mock_exists, mock_stat, mock_secho, mock_exit):
         """Test authentication with unexpected error."""
         # Setup mocks
         mock_exists.return_value = True
+        mock_stat.return_value.st_mtime_ns = 1
         mock_creds_from_file.side_effect = Exception("Unexpected error")
         mock_exit.side_effect = SystemExit(1)
         
         with pytest.raises(SystemExit):
             GmailClient("test@gmail.com")
         
-        mock_secho.assert_called()
+        mock_secho.assert_called_once()
         mock_exit.assert_called_once_with(code=1)
 
-    def test_count_emails_with_mock_service(self):
+    def test_count_emails_with_mock_service(self, gmail_execute_mock):
         """Test count_emails method with mocked service."""
+        mock_service, execute_mock = gmail_execute_mock
         with patch.object(GmailClient, 'authenticate') as mock_auth:
-            mock_service = MagicMock()
             mock_auth.return_value = mock_service
             
             # Setup mock responses
@@ -156,54 +184,53 @@ class TestGmailClient:
                 # No nextPageToken to end pagination
             }
             
-            mock_service.users().messages().list().execute.side_effect = [mock_response1, mock_response2]
+            execute_mock.side_effect = [mock_response1, mock_response2]
             
             client = GmailClient("test@gmail.com")
             count = client.count_emails()
             
             assert count == 3
-            assert mock_service.users().messages().list().execute.call_count == 2
+            assert execute_mock.call_count == 2
 
-    def test_count_emails_with_filters(self):
+    def test_count_emails_with_filters(self, gmail_execute_mock):
         """Test count_emails method with date and label filters."""
+        mock_service, execute_mock = gmail_execute_mock
         with patch.object(GmailClient, 'authenticate') as mock_auth:
-            mock_service = MagicMock()
             mock_auth.return_value = mock_service
             
             mock_response = {
                 'messages': [{'id': '1'}, {'id': '2'}],
             }
-            mock_service.users().messages().list().execute.return_value = mock_response
+            execute_mock.return_value = mock_response
             
             client = GmailClient("test@gmail.com")
             count = client.count_emails(after="2023-01-01", before="2023-12-31", label="INBOX")
             
             assert count == 2
             # Verify that the query and label filters were used
-            call_args = mock_service.users().messages().list.call_args
+            call_args = mock_service.users.return_value.messages.return_value.list.call_args
             assert 'q' in call_args[1]
             assert 'after:2023-01-01' in call_args[1]['q']
             assert 'before:2023-12-31' in call_args[1]['q']
             assert call_args[1]['labelIds'] == ["INBOX"]
 
-    def test_count_emails_with_empty_result(self):
+    def test_count_emails_with_empty_result(self, gmail_execute_mock):
         """Test count_emails method with empty result."""
+        mock_service, execute_mock = gmail_execute_mock
         with patch.object(GmailClient, 'authenticate') as mock_auth:
-            mock_service = MagicMock()
             mock_auth.return_value = mock_service
             
-            mock_response = {'messages': []}
-            mock_service.users().messages().list().execute.return_value = mock_response
+            execute_mock.return_value = {'messages': []}
             
             client = GmailClient("test@gmail.com")
             count = client.count_emails()
             
             assert count == 0
 
-    def test_count_emails_with_exception(self):
+    def test_count_emails_with_exception(self, gmail_execute_mock):
         """Test count_emails method handling exceptions during API calls."""
+        mock_service, execute_mock = gmail_execute_mock
         with patch.object(GmailClient, 'authenticate') as mock_auth:
-            mock_service = MagicMock()
             mock_auth.return_value = mock_service
             
             # First call succeeds, second call fails
@@ -211,7 +238,7 @@ class TestGmailClient:
                 'messages': [{'id': '1'}],
                 'nextPageToken': 'token123'
             }
-            mock_service.users().messages().list().execute.side_effect = [
+            execute_mock.side_effect = [
                 mock_response,
                 Exception("API Error")
             ]
@@ -222,15 +249,14 @@ class TestGmailClient:
             # Should return count from first successful call
             assert count == 1
 
-    @patch.dict('os.environ', {'GMAIL_COPY_TOOL_TIMING': '1'})
-    def test_count_emails_with_timing(self, capsys):
+    @patch('gmail_copy_tool.core.gmail_client.show_timing', True)
+    def test_count_emails_with_timing(self, gmail_execute_mock, capsys):
         """Test count_emails method with timing enabled."""
+        mock_service, execute_mock = gmail_execute_mock
         with patch.object(GmailClient, 'authenticate') as mock_auth:
-            mock_service = MagicMock()
             mock_auth.return_value = mock_service
             
-            mock_response = {'messages': [{'id': '1'}]}
-            mock_service.users().messages().list().execute.return_value = mock_response
+            execute_mock.return_value = {'messages': [{'id': '1'}]}
             
             client = GmailClient("test@gmail.com")
             count = client.count_emails()
@@ -245,32 +271,23 @@ class TestGmailClient:
         assert SCOPES_MODIFY == ["https://www.googleapis.com/auth/gmail.modify"]  
         assert SCOPES_HIGH_PERMISSION == ["https://mail.google.com/"]
 
-    @patch.dict('os.environ', {'GMAIL_COPY_TOOL_DEBUG': '1'})
-    def test_debug_mode_enabled(self):
-        """Test that debug mode is properly enabled."""
+    @pytest.mark.parametrize(
+        "debug_env,expected_level",
+        [
+            ("1", 10),  # DEBUG level when enabled
+            ("0", 30),  # WARNING level when disabled
+        ],
+    )
+    def test_debug_mode(self, monkeypatch, debug_env, expected_level):
+        """Test that debug mode sets the expected log level on import."""
+        monkeypatch.setenv('GMAIL_COPY_TOOL_DEBUG', debug_env)
         with patch('gmail_copy_tool.core.gmail_client.logging.getLogger') as mock_get_logger:
             mock_logger = MagicMock()
             mock_get_logger.return_value = mock_logger
-            
-            # Import after setting environment variable
-            import importlib
-            import gmail_copy_tool.core.gmail_client
-            importlib.reload(gmail_copy_tool.core.gmail_client)
-            
-            # Verify that debug level was set
-            mock_logger.setLevel.assert_called_with(10)  # DEBUG level
 
-    @patch.dict('os.environ', {'GMAIL_COPY_TOOL_DEBUG': '0'})
-    def test_debug_mode_disabled(self):
-        """Test that debug mode is properly disabled."""
-        with patch('gmail_copy_tool.core.gmail_client.logging.getLogger') as mock_get_logger:
-            mock_logger = MagicMock()
-            mock_get_logger.return_value = mock_logger
-            
             # Import after setting environment variable
             import importlib
             import gmail_copy_tool.core.gmail_client
             importlib.reload(gmail_copy_tool.core.gmail_client)
-            
-            # Verify that warning level was set (based on actual module behavior)
-            mock_logger.setLevel.assert_called_with(30)  # WARNING level
\ No newline at end of file
+
+            mock_logger.setLevel.assert_called_with(expected_level)
\ No newline at end of file
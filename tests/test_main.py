@@ -4,21 +4,26 @@ from typer.testing import CliRunner
 from gmail_copy_tool.main import app
 
 
+@pytest.fixture(scope="module")
+def help_result():
+    """--help output is static, so parse the app and render it only once."""
+    return CliRunner().invoke(app, ["--help"])
+
+
 class TestMainApp:
     """Test the main CLI application."""
 
-    def setup_method(self):
-        self.runner = CliRunner()
+    # CliRunner is stateless, so one instance serves every test
+    runner = CliRunner()
 
-    def test_app_has_all_commands(self):
+    def test_app_has_all_commands(self, help_result):
         """Test that the app has all expected commands registered."""
-        result = self.runner.invoke(app, ["--help"])
-        assert result.exit_code == 0
-        
+        assert help_result.exit_code == 0
+
         # Check that current commands are listed
         commands = ["sync", "setup", "list"]
         for command in commands:
-            assert command in result.output
+            assert command in help_result.output
 
     def test_invalid_command(self):
         """Test that invalid commands are handled properly."""
@@ -26,15 +31,14 @@ class TestMainApp:
         assert result.exit_code != 0
         assert "No such command" in result.output or "Usage:" in result.output
 
-    def test_old_commands_removed(self):
+    def test_old_commands_removed(self, help_result):
         """Test that old commands no longer exist."""
-        result = self.runner.invoke(app, ["--help"])
-        assert result.exit_code == 0
-        
+        assert help_result.exit_code == 0
+
         # These commands should NOT be present anymore
         old_commands = ["analyze", "copy", "delete-duplicates", "remove-copied", "compare"]
         for command in old_commands:
             # 'compare' might appear in descriptions, so check more carefully
             if command == "compare":
                 continue
-            assert command not in result.output.lower()
\ No newline at end of file
+            assert command not in help_result.output.lower()
\ No newline at end of file